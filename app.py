@@ -5,10 +5,20 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import tempfile
+import copy
 import os
+import sys
 import re
+import signal
+import time
+import hashlib
+import queue
+import multiprocessing
 from datetime import datetime
 from matplotlib.colors import ListedColormap
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import ndimage, sparse
+from scipy.sparse import csgraph
 import traceback
 
 # Page config
@@ -336,28 +346,110 @@ def detect_data_age(radar):
         st.warning(f"Error detecting data age: {e}, defaulting to new")
         return "new"
 
-def advanced_velocity_dealiasing_new_data(radar, vel_sweep):
+def get_nyquist_velocity(radar, vel_sweep, default=28.0):
+    """Get the Nyquist velocity (m/s) for a sweep, falling back to a default"""
+    nyq = default
+    if 'nyquist_velocity' in radar.instrument_parameters:
+        nyq_data = radar.instrument_parameters['nyquist_velocity']['data']
+        sweep_slice = radar.get_slice(vel_sweep)
+        if len(nyq_data) > 0:
+            if len(nyq_data) > sweep_slice.start:
+                nyq_temp = nyq_data[sweep_slice.start]
+            else:
+                nyq_temp = nyq_data[0]
+            if nyq_temp > 0 and nyq_temp < 100:
+                nyq = float(nyq_temp)
+    return nyq
+
+# Gates this strong are candidate rotation cores for the tornadic dealiasing branch
+TORNADIC_MIN_REFLECTIVITY = 30.0
+
+QC_DEFAULTS = {
+    'min_reflectivity': -10.0,
+    'max_texture': 15.0,
+    'min_range_km': 2.0,
+    'max_range_km': 300.0,
+    'min_region_gates': 10
+}
+
+def label_sweep_regions(radar, mask):
+    """Label connected gates of a full-volume mask without joining regions across sweep boundaries"""
+    # A blank ray inserted before every sweep start keeps sweeps apart in a single label pass
+    breaks = radar.sweep_start_ray_index['data'][1:]
+    separated = np.insert(mask, breaks, False, axis=0)
+    labels, count = ndimage.label(separated)
+
+    keep = np.ones(len(separated), dtype=bool)
+    keep[breaks + np.arange(len(breaks))] = False
+    return labels[keep], count
+
+def count_velocity_regions(radar, nyq, gatefilter=None, interval_splits=3):
+    """Count the connected velocity regions region-based dealiasing has to unfold"""
+    velocity = np.ma.masked_invalid(radar.fields['velocity']['data'])
+    valid = ~np.ma.getmaskarray(velocity)
+    if gatefilter is not None:
+        valid &= ~gatefilter.gate_excluded
+
+    # Regions are built per Nyquist interval, as in pyart.correct.dealias_region_based
+    interval_width = 2.0 * nyq / interval_splits
+    interval = np.clip(((velocity.filled(0) + nyq) // interval_width).astype(int), 0, interval_splits - 1)
+
+    total = 0
+    for i in range(interval_splits):
+        total += label_sweep_regions(radar, valid & (interval == i))[1]
+    return total
+
+def build_qc_gatefilter(radar, qc_config=None):
+    """Build one combined gate filter removing speckle, weak echo, noisy texture and out-of-range gates"""
+    config = dict(QC_DEFAULTS, **(qc_config or {}))
+    gatefilter = pyart.filters.GateFilter(radar)
+    gatefilter.exclude_invalid('velocity')
+
+    # Strong echo is left to the tornadic branch, where high texture is the signal rather than noise
+    if 'reflectivity' in radar.fields:
+        strong_echo = np.ma.filled(radar.fields['reflectivity']['data'] >= TORNADIC_MIN_REFLECTIVITY, False)
+    else:
+        strong_echo = np.zeros((radar.nrays, radar.ngates), dtype=bool)
+
+    # Reflectivity floor (split-cut Doppler sweeps may carry no reflectivity, so keep masked gates)
+    if 'reflectivity' in radar.fields:
+        gatefilter.exclude_below('reflectivity', config['min_reflectivity'], exclude_masked=False)
+
+    # Texture ceiling
+    if config['max_texture']:
+        if 'vel_texture' not in radar.fields:
+            vel_texture = pyart.retrieve.calculate_velocity_texture(radar, vel_field='velocity')
+            radar.add_field('vel_texture', vel_texture, replace_existing=True)
+        noisy = np.ma.filled(radar.fields['vel_texture']['data'] > config['max_texture'], False)
+        gatefilter.exclude_gates(noisy & ~strong_echo)
+
+    # Range masks
+    gate_range_km = radar.range['data'] / 1000.0
+    out_of_range = (gate_range_km < config['min_range_km']) | (gate_range_km > config['max_range_km'])
+    gatefilter.exclude_gates(np.broadcast_to(out_of_range, (radar.nrays, radar.ngates)))
+
+    # Despeckle: drop connected components smaller than the minimum size
+    if config['min_region_gates'] > 1:
+        labels, _ = label_sweep_regions(radar, ~gatefilter.gate_excluded)
+        sizes = np.bincount(labels.ravel())
+        speckle = (sizes[labels] < config['min_region_gates']) & (labels > 0)
+        gatefilter.exclude_gates(speckle & ~strong_echo)
+
+    return gatefilter
+
+def advanced_velocity_dealiasing_new_data(radar, vel_sweep, gatefilter=None, raise_errors=False):
     """Advanced dealiasing for new data with tornadic signature handling"""
     try:
         # Get Nyquist velocity
-        nyq = 28.0
-        if 'nyquist_velocity' in radar.instrument_parameters:
-            nyq_data = radar.instrument_parameters['nyquist_velocity']['data']
-            sweep_slice = radar.get_slice(vel_sweep)
-            if len(nyq_data) > 0:
-                if len(nyq_data) > sweep_slice.start:
-                    nyq_temp = nyq_data[sweep_slice.start]
-                else:
-                    nyq_temp = nyq_data[0]
-                if nyq_temp > 0 and nyq_temp < 100:
-                    nyq = float(nyq_temp)
+        nyq = get_nyquist_velocity(radar, vel_sweep)
 
-        # Calculate velocity texture
-        vel_texture = pyart.retrieve.calculate_velocity_texture(radar, vel_field='velocity')
-        radar.add_field('vel_texture', vel_texture, replace_existing=True)
+        # Calculate velocity texture (QC may already have added it)
+        if 'vel_texture' not in radar.fields:
+            vel_texture = pyart.retrieve.calculate_velocity_texture(radar, vel_field='velocity')
+            radar.add_field('vel_texture', vel_texture, replace_existing=True)
 
         # Create gate filter for non-tornadic areas
-        gfilter_nontornadic = pyart.filters.GateFilter(radar)
+        gfilter_nontornadic = gatefilter.copy() if gatefilter is not None else pyart.filters.GateFilter(radar)
         gfilter_nontornadic.exclude_above('vel_texture', 5)
 
         # Dealias non-tornadic velocity field
@@ -370,15 +462,16 @@ def advanced_velocity_dealiasing_new_data(radar, vel_sweep):
         radar.add_field('dealiased_nontornadic', corrected_vel_nontornadic, replace_existing=True)
 
         # Create gate filter for tornadic signatures
-        gfilter_tornadic = pyart.filters.GateFilter(radar)
-        gfilter_tornadic.exclude_below('reflectivity', 30)
+        gfilter_tornadic = gatefilter.copy() if gatefilter is not None else pyart.filters.GateFilter(radar)
+        gfilter_tornadic.exclude_below('reflectivity', TORNADIC_MIN_REFLECTIVITY)
         gfilter_tornadic.exclude_below('vel_texture', 5)
 
         # Dealias tornadic signatures
         corrected_vel_temp = pyart.correct.dealias_region_based(
             radar,
             vel_field="velocity",
-            nyquist_vel=nyq
+            nyquist_vel=nyq,
+            gatefilter=gatefilter
         )
         radar.add_field('temp_dealiased_velocity', corrected_vel_temp, replace_existing=True)
 
@@ -401,24 +494,16 @@ def advanced_velocity_dealiasing_new_data(radar, vel_sweep):
         return True
 
     except Exception as e:
+        if raise_errors:
+            raise
         st.warning(f"Advanced dealiasing failed: {e}")
         return False
 
-def simple_velocity_dealiasing_old_data(radar, vel_sweep):
+def simple_velocity_dealiasing_old_data(radar, vel_sweep, gatefilter=None, raise_errors=False):
     """Simple dealiasing for old data"""
     try:
         # Get Nyquist velocity
-        nyq = 28.0
-        if 'nyquist_velocity' in radar.instrument_parameters:
-            nyq_data = radar.instrument_parameters['nyquist_velocity']['data']
-            sweep_slice = radar.get_slice(vel_sweep)
-            if len(nyq_data) > 0:
-                if len(nyq_data) > sweep_slice.start:
-                    nyq_temp = nyq_data[sweep_slice.start]
-                else:
-                    nyq_temp = nyq_data[0]
-                if nyq_temp > 0 and nyq_temp < 100:
-                    nyq = float(nyq_temp)
+        nyq = get_nyquist_velocity(radar, vel_sweep)
 
         # Simple region-based dealiasing
         velocity_dealiased = pyart.correct.dealias_region_based(
@@ -427,7 +512,7 @@ def simple_velocity_dealiasing_old_data(radar, vel_sweep):
             nyquist_vel=nyq,
             centered=True,
             keep_original=True,
-            gatefilter=False
+            gatefilter=gatefilter if gatefilter is not None else False
         )
 
         radar.add_field("corrected_velocity", velocity_dealiased, replace_existing=True)
@@ -436,9 +521,132 @@ def simple_velocity_dealiasing_old_data(radar, vel_sweep):
         return True
 
     except Exception as e:
+        if raise_errors:
+            raise
         st.warning(f"Simple dealiasing failed: {e}")
         return False
 
+DEALIAS_TIERS = {
+    'advanced': ("Advanced (texture + region + unwrap_phase)", advanced_velocity_dealiasing_new_data),
+    'simple': ("Simple region-based", simple_velocity_dealiasing_old_data),
+    'raw': ("Raw velocity", None)
+}
+
+WORKER_START_TIMEOUT = 5.0
+FALLBACK_START_FRACTION = 0.5
+WORKER_JOIN_TIMEOUT = 1.0
+
+def _dealias_tier_worker(radar, vel_sweep, gatefilter, tier, result_queue):
+    """Run one dealiasing tier in a worker process and send the corrected field back"""
+    # Drop the SIGTERM handler inherited from the Streamlit server, which would only queue a server stop
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # Report in first, so a child that hangs straight after fork is told apart from a slow tier
+    result_queue.put((tier, 'started', None, 0.0))
+    start_time = time.perf_counter()
+    try:
+        DEALIAS_TIERS[tier][1](radar, vel_sweep, gatefilter, raise_errors=True)
+        result_queue.put((tier, 'done', radar.fields['corrected_velocity'], time.perf_counter() - start_time))
+    except Exception as e:
+        result_queue.put((tier, 'failed', str(e), time.perf_counter() - start_time))
+
+def schedule_dealiasing(radar, vel_sweep, tiers, gatefilter=None, time_budget=30.0):
+    """Run dealiasing tiers in staggered workers and return the best tier finished within the time budget"""
+    results, notes = {}, {}
+
+    if time_budget <= 0:
+        return 'raw', radar.fields['velocity'], {tier: "no time left in the budget" for tier in tiers}
+
+    # Forked workers are only used on Linux. macOS lists fork but it is unsafe with system
+    # frameworks, and Windows has no fork; there the tiers run in order without a hard bound.
+    if not sys.platform.startswith('linux'):
+        for tier in tiers:
+            start_time = time.perf_counter()
+            if DEALIAS_TIERS[tier][1](radar, vel_sweep, gatefilter):
+                notes[tier] = f"completed in {time.perf_counter() - start_time:.1f} s (no time budget on this platform)"
+                return tier, radar.fields['corrected_velocity'], notes
+            notes[tier] = "failed"
+        return 'raw', radar.fields['velocity'], notes
+
+    # Forked workers inherit the loaded volume without pickling it and can be killed at the
+    # deadline. The Streamlit server is multi-threaded, so a child can inherit a lock held by
+    # another thread and hang before it starts; the start report below catches that case.
+    context = multiprocessing.get_context('fork')
+    result_queue = context.Queue()
+    workers = {
+        tier: context.Process(
+            target=_dealias_tier_worker,
+            args=(radar, vel_sweep, gatefilter, tier, result_queue),
+            daemon=True
+        )
+        for tier in tiers
+    }
+    launched, started = {}, set()
+
+    start_time = time.monotonic()
+    deadline = start_time + time_budget
+    timed_out = False
+    try:
+        while True:
+            # Stop as soon as every tier ranked above the best result has failed
+            pending = [tier for tier in tiers if tier not in results and tier not in notes]
+            best = next((tier for tier in tiers if tier in results), None)
+            if not pending or (best is not None and tiers.index(best) < tiers.index(pending[0])):
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+
+            # Fallback tiers start only once every running tier has failed or used its share of
+            # the budget, so a normal upload runs a single worker
+            unlaunched = [tier for tier in tiers if tier not in launched]
+            running = [tier for tier in launched if tier in pending]
+            elapsed = time.monotonic() - start_time
+            if unlaunched and (not running or elapsed >= len(launched) * FALLBACK_START_FRACTION * time_budget):
+                workers[unlaunched[0]].start()
+                launched[unlaunched[0]] = time.monotonic()
+
+            try:
+                tier, status, payload, seconds = result_queue.get(timeout=min(remaining, 0.25))
+            except queue.Empty:
+                for tier in running:
+                    # A worker that died without reporting (e.g. killed by the OS) will never finish
+                    if workers[tier].exitcode not in (None, 0):
+                        notes[tier] = f"worker exited with code {workers[tier].exitcode}"
+                    elif tier not in started and time.monotonic() - launched[tier] > WORKER_START_TIMEOUT:
+                        notes[tier] = f"worker did not start within {WORKER_START_TIMEOUT:.0f} s"
+                continue
+
+            if status == 'started':
+                started.add(tier)
+            elif status == 'done':
+                results[tier] = payload
+                notes[tier] = f"completed in {seconds:.1f} s"
+            else:
+                notes[tier] = f"failed after {seconds:.1f} s: {payload}"
+    finally:
+        # SIGKILL, since a child stuck on an inherited lock may never run a SIGTERM handler
+        for tier in launched:
+            if workers[tier].is_alive():
+                workers[tier].kill()
+            workers[tier].join(timeout=WORKER_JOIN_TIMEOUT)
+
+    for tier in tiers:
+        if tier in notes:
+            continue
+        if tier not in launched:
+            notes[tier] = "not started before the deadline" if timed_out else "not needed, a better tier finished first"
+        else:
+            notes[tier] = f"exceeded the {time_budget:.1f} s budget" if timed_out else "stopped, a better tier finished first"
+    notes = {tier: notes[tier] for tier in tiers}
+
+    for tier in tiers:
+        if tier in results:
+            return tier, results[tier], notes
+    return 'raw', radar.fields['velocity'], notes
+
 def find_best_sweep(radar, field_name):
     """Find the best sweep with most valid data points"""
     for sweep_idx in range(radar.nsweeps):
@@ -449,48 +657,205 @@ def find_best_sweep(radar, field_name):
             return sweep_idx
     return 0
 
-def create_plotly_radar_plot(radar, field_name, sweep_idx, title, color_scale, vmin, vmax, max_range=250, show_range_rings=True):
-    """Create interactive Plotly radar plot"""
-    # Get data for the sweep
+def compute_azimuthal_shear(radar, sweep_idx, vel_field='corrected_velocity', ray_window=5, gate_window=3, min_valid_fraction=0.5):
+    """Compute azimuthal shear (1/s) using linear least-squares derivatives over sliding ray/gate windows"""
+    sweep_slice = radar.get_slice(sweep_idx)
+    velocity = np.ma.masked_invalid(radar.fields[vel_field]['data'][sweep_slice])
+    valid = ~np.ma.getmaskarray(velocity)
+
+    ranges = radar.range['data'].astype(np.float64)
+    azimuths = radar.azimuth['data'][sweep_slice].astype(np.float64)
+    ray_half = ray_window // 2
+    gate_half = gate_window // 2
+
+    # Arc distance of every window gate from the window centre is range * delta_azimuth,
+    # so the least-squares sums separate into a range-only and an azimuth-only factor
+    weights = valid.astype(np.float64)
+    values = np.where(valid, velocity.filled(0), 0).astype(np.float64)
+    r = ranges[np.newaxis, :]
+    gate_terms = np.stack([weights, weights * r, weights * r * r, values, values * r])
+
+    # Window sums along range (zero padded so edge gates only see real data)
+    gate_terms = np.pad(gate_terms, ((0, 0), (0, 0), (gate_half, gate_half)))
+    gate_sums = sliding_window_view(gate_terms, gate_window, axis=2).sum(axis=-1)
+
+    # Window views along azimuth (wrapped, since a PPI sweep is a full circle)
+    gate_sums = np.pad(gate_sums, ((0, 0), (ray_half, ray_half), (0, 0)), mode='wrap')
+    ray_views = sliding_window_view(gate_sums, ray_window, axis=1)
+
+    # Signed azimuth offset (radians) of each window ray from the centre ray
+    az_padded = np.concatenate([azimuths[-ray_half:], azimuths, azimuths[:ray_half]]) if ray_half else azimuths
+    az_windows = sliding_window_view(az_padded, ray_window)
+    d_theta = np.deg2rad((az_windows - azimuths[:, np.newaxis] + 180.0) % 360.0 - 180.0)
+
+    sum_w = ray_views[0].sum(axis=-1)
+    sum_s = np.einsum('rgk,rk->rg', ray_views[1], d_theta)
+    sum_ss = np.einsum('rgk,rk->rg', ray_views[2], d_theta * d_theta)
+    sum_v = ray_views[3].sum(axis=-1)
+    sum_sv = np.einsum('rgk,rk->rg', ray_views[4], d_theta)
+
+    # Least-squares slope dV/ds of velocity against arc distance
+    denominator = sum_w * sum_ss - sum_s * sum_s
+    min_valid = min_valid_fraction * ray_window * gate_window
+    usable = valid & (sum_w >= min_valid) & (denominator > 1e-6)
+    shear = np.zeros_like(denominator)
+    np.divide(sum_w * sum_sv - sum_s * sum_v, denominator, out=shear, where=usable)
+
+    return np.ma.masked_array(shear, mask=~usable)
+
+def add_azimuthal_shear_field(radar, sweep_idx, vel_field='corrected_velocity'):
+    """Add an azimuthal shear field (10^-3 s^-1) for one sweep to the radar object"""
+    shear = compute_azimuthal_shear(radar, sweep_idx, vel_field=vel_field)
+
+    shear_data = np.ma.masked_all(radar.fields[vel_field]['data'].shape, dtype=np.float32)
+    shear_data[radar.get_slice(sweep_idx)] = shear * 1000.0
+
+    radar.add_field('azimuthal_shear', {
+        'data': shear_data,
+        'units': '10^-3 s^-1',
+        'long_name': 'Azimuthal shear',
+        'sweep': sweep_idx
+    }, replace_existing=True)
+
+def find_rotation_couplets(radar, sweep_idx, threshold, min_gates=4):
+    """Locate cyclonic shear areas above threshold and return their peak positions (km) and values"""
+    sweep_slice = radar.get_slice(sweep_idx)
+    shear = radar.fields['azimuthal_shear']['data'][sweep_slice]
+    shear_filled = np.ma.filled(shear, 0.0)
+
+    labels, count = ndimage.label(shear_filled >= threshold)
+    if count == 0:
+        return {'x': np.array([]), 'y': np.array([]), 'shear': np.array([])}
+
+    # ndimage.label does not wrap, so a vortex straddling north is split in two;
+    # join labels that touch across the seam when the sweep closes the circle
+    azimuths = radar.azimuth['data'][sweep_slice]
+    seam_gap = (azimuths[0] - azimuths[-1]) % 360.0
+    if len(azimuths) > 1 and seam_gap <= 2.0 * np.median(np.abs(np.diff(azimuths)) % 360.0):
+        seam = (labels[0] > 0) & (labels[-1] > 0)
+        if seam.any():
+            pairs = sparse.coo_matrix((np.ones(seam.sum()), (labels[0][seam], labels[-1][seam])),
+                                      shape=(count + 1, count + 1))
+            _, component = csgraph.connected_components(pairs, directed=False)
+            # Label 0 is its own component, so background stays 0 after the shift
+            labels = np.where(labels > 0, component[labels], 0)
+            count = labels.max()
+
+    # Drop speckle-sized areas before reducing each label to its peak
+    sizes = np.bincount(labels.ravel(), minlength=count + 1)
+    index = np.flatnonzero(sizes >= min_gates)
+    index = index[index > 0]
+    if len(index) == 0:
+        return {'x': np.array([]), 'y': np.array([]), 'shear': np.array([])}
+
+    peaks = np.array(ndimage.maximum_position(shear_filled, labels, index)).reshape(-1, 2)
+    peak_values = np.asarray(ndimage.maximum(shear_filled, labels, index))
+
+    ray_idx, gate_idx = peaks[:, 0], peaks[:, 1]
+    azimuths = np.deg2rad(radar.azimuth['data'][sweep_slice][ray_idx])
+    elevations = np.deg2rad(radar.elevation['data'][sweep_slice][ray_idx])
+    ranges = radar.range['data'][gate_idx]
+
+    return {
+        'x': ranges * np.sin(azimuths) * np.cos(elevations) / 1000.0,
+        'y': ranges * np.cos(azimuths) * np.cos(elevations) / 1000.0,
+        'shear': peak_values
+    }
+
+RENDER_MODES = ["Native Gates", "Cartesian Grid"]
+
+def build_azimuth_lookup(azimuths, bins_per_degree=10, max_gap=1.0):
+    """Map fixed azimuth bins to the index of the nearest ray (-1 where no ray is within max_gap degrees)"""
+    azimuths = np.mod(np.asarray(azimuths, dtype=np.float64), 360.0)
+    order = np.argsort(azimuths)
+    sorted_az = azimuths[order]
+    centers = (np.arange(360 * bins_per_degree) + 0.5) / bins_per_degree
+
+    # Nearest ray is either side of the insertion point, wrapping around north
+    pos = np.searchsorted(sorted_az, centers)
+    upper = order[pos % len(order)]
+    lower = order[(pos - 1) % len(order)]
+    d_upper = np.abs((azimuths[upper] - centers + 180.0) % 360.0 - 180.0)
+    d_lower = np.abs((azimuths[lower] - centers + 180.0) % 360.0 - 180.0)
+
+    lookup = np.where(d_lower <= d_upper, lower, upper)
+    lookup[np.minimum(d_lower, d_upper) > max_gap] = -1
+    return lookup
+
+def lookup_ray_index(lookup, azimuth_deg):
+    """Return the nearest ray index for each azimuth (degrees) from an azimuth lookup table"""
+    bins_per_degree = len(lookup) // 360
+    bins = (np.mod(azimuth_deg, 360.0) * bins_per_degree).astype(np.intp)
+    return lookup[np.minimum(bins, len(lookup) - 1)]
+
+def grid_sweep_to_cartesian(radar, field_name, sweep_idx, resolution_km=1.0):
+    """Resample one sweep onto a regular Cartesian grid (km) using nearest ray/gate lookups"""
     sweep_slice = radar.get_slice(sweep_idx)
     field_data = radar.fields[field_name]['data'][sweep_slice]
-    
-    # Get radar coordinates - fix broadcasting issue
-    try:
-        # Get range and angle data for this sweep
-        ranges = radar.range['data']
-        azimuths = radar.azimuth['data'][sweep_slice]
-        elevations = radar.elevation['data'][sweep_slice]
-        
-        # Create meshgrid for proper broadcasting
-        range_2d, azimuth_2d = np.meshgrid(ranges, azimuths)
-        elevation_2d = np.broadcast_to(elevations.reshape(-1, 1), azimuth_2d.shape)
-        
-        # Convert to cartesian coordinates
-        x = range_2d * np.sin(np.deg2rad(azimuth_2d)) * np.cos(np.deg2rad(elevation_2d))
-        y = range_2d * np.cos(np.deg2rad(azimuth_2d)) * np.cos(np.deg2rad(elevation_2d))
+    elevation = np.deg2rad(np.mean(radar.elevation['data'][sweep_slice]))
+
+    # Ground range of each gate, matching the projection used for native plots
+    ground_ranges = radar.range['data'] * np.cos(elevation) / 1000.0
+    gate_spacing = ground_ranges[1] - ground_ranges[0] if len(ground_ranges) > 1 else 1.0
+
+    half_cells = int(ground_ranges[-1] // resolution_km)
+    coords = np.arange(-half_cells, half_cells + 1) * resolution_km
+    grid_x, grid_y = np.meshgrid(coords, coords)
+
+    lookup = build_azimuth_lookup(radar.azimuth['data'][sweep_slice])
+    ray_idx = lookup_ray_index(lookup, np.rad2deg(np.arctan2(grid_x, grid_y)))
+    gate_idx = np.rint((np.hypot(grid_x, grid_y) - ground_ranges[0]) / gate_spacing).astype(np.intp)
+    valid = (ray_idx >= 0) & (gate_idx >= 0) & (gate_idx < len(ground_ranges))
+
+    grid = np.ma.masked_array(np.zeros(grid_x.shape, dtype=np.float32), mask=True)
+    grid[valid] = field_data[ray_idx[valid], gate_idx[valid]]
+
+    return coords, coords, grid
+
+def create_radar_trace(radar, field_name, sweep_idx, title, color_scale, vmin, vmax, render_mode="Native Gates"):
+    """Create the Plotly heatmap trace holding one sweep of radar data"""
+    if render_mode == "Cartesian Grid":
+        x, y, field_data = grid_sweep_to_cartesian(radar, field_name, sweep_idx)
+    else:
+        # Get data for the sweep
+        sweep_slice = radar.get_slice(sweep_idx)
+        field_data = radar.fields[field_name]['data'][sweep_slice]
         
-        # Convert to km
-        x = x / 1000.0
-        y = y / 1000.0
+        # Get radar coordinates - fix broadcasting issue
+        try:
+            # Get range and angle data for this sweep
+            ranges = radar.range['data']
+            azimuths = radar.azimuth['data'][sweep_slice]
+            elevations = radar.elevation['data'][sweep_slice]
+            
+            # Create meshgrid for proper broadcasting
+            range_2d, azimuth_2d = np.meshgrid(ranges, azimuths)
+            elevation_2d = np.broadcast_to(elevations.reshape(-1, 1), azimuth_2d.shape)
+            
+            # Convert to cartesian coordinates
+            x = range_2d * np.sin(np.deg2rad(azimuth_2d)) * np.cos(np.deg2rad(elevation_2d))
+            y = range_2d * np.cos(np.deg2rad(azimuth_2d)) * np.cos(np.deg2rad(elevation_2d))
+            
+            # Convert to km
+            x = x / 1000.0
+            y = y / 1000.0
+            
+        except Exception as e:
+            st.error(f"Error creating coordinate system: {e}")
+            # Fallback: create simple coordinate system
+            ranges = radar.range['data']
+            azimuths = radar.azimuth['data'][sweep_slice]
+            range_2d, azimuth_2d = np.meshgrid(ranges, azimuths)
+            x = range_2d * np.sin(np.deg2rad(azimuth_2d)) / 1000.0
+            y = range_2d * np.cos(np.deg2rad(azimuth_2d)) / 1000.0
         
-    except Exception as e:
-        st.error(f"Error creating coordinate system: {e}")
-        # Fallback: create simple coordinate system
-        ranges = radar.range['data']
-        azimuths = radar.azimuth['data'][sweep_slice]
-        range_2d, azimuth_2d = np.meshgrid(ranges, azimuths)
-        x = range_2d * np.sin(np.deg2rad(azimuth_2d)) / 1000.0
-        y = range_2d * np.cos(np.deg2rad(azimuth_2d)) / 1000.0
-    
-    # Create the plot
-    fig = go.Figure()
+        x = x[0, :] if x.ndim > 1 else x
+        y = y[:, 0] if y.ndim > 1 else y
     
-    # Add the radar data as a heatmap
-    fig.add_trace(go.Heatmap(
-        x=x[0, :] if x.ndim > 1 else x,
-        y=y[:, 0] if y.ndim > 1 else y,
-        z=field_data,
+    return go.Heatmap(
+        x=x,
+        y=y,
+        z=np.ma.filled(np.ma.asarray(field_data, dtype=np.float32), np.nan),
         colorscale=color_scale,
         zmin=vmin,
         zmax=vmax,
@@ -501,24 +866,34 @@ def create_plotly_radar_plot(radar, field_name, sweep_idx, title, color_scale, v
                       'Value: %{z:.1f}<br>' +
                       '<extra></extra>',
         name=title
-    ))
-    
-    # Add range rings if requested
+    )
+
+def apply_view_settings(fig, max_range=250, show_range_rings=True, overlay_shapes=None):
+    """Patch axis ranges, range rings and overlay shapes on a radar figure without touching its data"""
+    # Range rings as layout circles rather than polyline traces
+    ring_shapes = []
     if show_range_rings:
-        theta = np.linspace(0, 2*np.pi, 100)
-        ring_distances = np.arange(50, max_range + 1, 50)
-        for r in ring_distances:
-            x_ring = r * np.cos(theta)
-            y_ring = r * np.sin(theta)
-            fig.add_trace(go.Scatter(
-                x=x_ring, y=y_ring,
-                mode='lines',
+        for r in np.arange(50, max_range + 1, 50):
+            ring_shapes.append(dict(
+                type='circle', xref='x', yref='y',
+                x0=-r, y0=-r, x1=r, y1=r,
                 line=dict(color='rgba(255,255,255,0.3)', width=1, dash='dash'),
-                showlegend=False,
-                hoverinfo='skip',
-                name=f'{r} km range'
+                layer='above'
             ))
     
+    fig.update_layout(
+        xaxis_range=[-max_range, max_range],
+        yaxis_range=[-max_range, max_range],
+        shapes=ring_shapes + list(overlay_shapes or [])
+    )
+    return fig
+
+def create_plotly_radar_plot(radar, field_name, sweep_idx, title, color_scale, vmin, vmax, max_range=250, show_range_rings=True, render_mode="Native Gates"):
+    """Create interactive Plotly radar plot"""
+    fig = go.Figure(data=[create_radar_trace(
+        radar, field_name, sweep_idx, title, color_scale, vmin, vmax, render_mode
+    )])
+    
     # Configure layout
     fig.update_layout(
         title=dict(
@@ -528,7 +903,6 @@ def create_plotly_radar_plot(radar, field_name, sweep_idx, title, color_scale, v
         ),
         xaxis=dict(
             title='Distance East (km)',
-            range=[-max_range, max_range],
             scaleanchor='y',
             scaleratio=1,
             showgrid=True,
@@ -536,18 +910,393 @@ def create_plotly_radar_plot(radar, field_name, sweep_idx, title, color_scale, v
         ),
         yaxis=dict(
             title='Distance North (km)',
-            range=[-max_range, max_range],
             showgrid=True,
             gridcolor='rgba(255,255,255,0.1)'
         ),
         width=800,
         height=800,
         template='plotly_dark',
-        margin=dict(l=50, r=50, t=80, b=50)
+        margin=dict(l=50, r=50, t=80, b=50),
+        # Keep the user's zoom and pan across reruns of the same product
+        uirevision=f"{field_name}:{sweep_idx}"
     )
     
+    return apply_view_settings(fig, max_range, show_range_rings)
+
+MAX_CACHED_FIGURES = 8
+
+def get_radar_figure(volume, field_name, sweep_idx, title, color_scale, vmin, vmax, max_range=250, show_range_rings=True, render_mode="Native Gates", overlay_shapes=None):
+    """Return the memoized figure for a volume/field/sweep/render mode with view settings applied"""
+    # Memoizing skips rebuilding the heatmap, but st.plotly_chart still serializes the
+    # whole figure on every rerun, so view changes are cheaper rather than free
+    figures = volume.setdefault('figures', {})
+    key = (field_name, sweep_idx, render_mode)
+    fig = figures.pop(key, None)
+    if fig is None:
+        fig = create_plotly_radar_plot(
+            volume['radar'], field_name, sweep_idx, title, color_scale, vmin, vmax,
+            max_range, show_range_rings, render_mode
+        )
+    else:
+        # Drop overlays from the previous run; only the data trace is reused
+        fig.data = fig.data[:1]
+
+    # Least recently used figures are evicted first
+    figures[key] = fig
+    while len(figures) > MAX_CACHED_FIGURES:
+        figures.pop(next(iter(figures)))
+    return apply_view_settings(fig, max_range, show_range_rings, overlay_shapes)
+
+EFFECTIVE_EARTH_RADIUS = 4.0 / 3.0 * 6371000.0
+NEXRAD_BEAMWIDTH = 0.95
+
+def build_volume_geometry(radar):
+    """Precompute per-sweep azimuth lookup tables and beam geometry (4/3 earth radius model)"""
+    ranges = radar.range['data'].astype(np.float64)
+    geometry = []
+    for sweep_idx in range(radar.nsweeps):
+        sweep_slice = radar.get_slice(sweep_idx)
+        elevation = float(np.mean(radar.elevation['data'][sweep_slice]))
+        sin_el = np.sin(np.deg2rad(elevation))
+        cos_el = np.cos(np.deg2rad(elevation))
+
+        # Beam centre height above the radar and ground distance for every gate
+        height = np.sqrt(ranges ** 2 + EFFECTIVE_EARTH_RADIUS ** 2 + 2.0 * ranges * EFFECTIVE_EARTH_RADIUS * sin_el) - EFFECTIVE_EARTH_RADIUS
+        ground_range = EFFECTIVE_EARTH_RADIUS * np.arcsin(ranges * cos_el / (EFFECTIVE_EARTH_RADIUS + height))
+
+        geometry.append({
+            'sweep': sweep_idx,
+            'slice': sweep_slice,
+            'elevation': elevation,
+            'lookup': build_azimuth_lookup(radar.azimuth['data'][sweep_slice]),
+            'ground_range_km': ground_range / 1000.0,
+            'height_km': height / 1000.0
+        })
+    return geometry
+
+def select_cross_section_sweeps(radar, geometry, field_name):
+    """Pick one sweep per elevation angle (the one with most valid gates), ordered by elevation"""
+    best = {}
+    for sweep_geometry in geometry:
+        field_data = radar.fields[field_name]['data'][sweep_geometry['slice']]
+        valid_points = int(np.ma.count(field_data))
+        if valid_points == 0:
+            continue
+        elevation_key = round(sweep_geometry['elevation'], 1)
+        if elevation_key not in best or valid_points > best[elevation_key][0]:
+            best[elevation_key] = (valid_points, sweep_geometry)
+    return [best[key][1] for key in sorted(best)]
+
+def compute_cross_section(radar, sweeps, field_name, start_km, end_km, n_points=300, max_height_km=15.0, height_step_km=0.25):
+    """Interpolate a vertical cross-section of a field along a line between two PPI points (km)"""
+    fraction = np.linspace(0.0, 1.0, n_points)
+    x = start_km[0] + fraction * (end_km[0] - start_km[0])
+    y = start_km[1] + fraction * (end_km[1] - start_km[1])
+    distance = fraction * np.hypot(end_km[0] - start_km[0], end_km[1] - start_km[1])
+    point_range = np.hypot(x, y)
+    point_azimuth = np.rad2deg(np.arctan2(x, y))
+    heights_km = np.arange(0.0, max_height_km + height_step_km / 2, height_step_km)
+
+    # Beam-centre value and height of every sweep above every point on the line
+    beam_values = np.full((len(sweeps), n_points), np.nan)
+    beam_heights = np.full((len(sweeps), n_points), np.nan)
+    for k, sweep_geometry in enumerate(sweeps):
+        ground_range = sweep_geometry['ground_range_km']
+        ray_idx = lookup_ray_index(sweep_geometry['lookup'], point_azimuth)
+        gate_idx = np.clip(np.searchsorted(ground_range, point_range), 1, len(ground_range) - 1)
+        gate_idx -= (point_range - ground_range[gate_idx - 1]) < (ground_range[gate_idx] - point_range)
+        valid = (ray_idx >= 0) & (point_range <= ground_range[-1])
+
+        field_data = radar.fields[field_name]['data'][sweep_geometry['slice']]
+        samples = np.ma.filled(field_data[ray_idx[valid], gate_idx[valid]].astype(np.float64), np.nan)
+        beam_values[k, valid] = samples
+        beam_heights[k] = np.interp(point_range, ground_range, sweep_geometry['height_km'])
+
+    section = np.full((len(heights_km), n_points), np.nan)
+    if len(sweeps) == 0:
+        return distance, heights_km, np.ma.masked_invalid(section)
+
+    z = heights_km[np.newaxis, :, np.newaxis]
+    columns = np.arange(n_points)[np.newaxis, :]
+
+    # Linear interpolation between the sweeps bracketing each height
+    if len(sweeps) > 1:
+        upper = np.clip((beam_heights[:, np.newaxis, :] <= z).sum(axis=0), 1, len(sweeps) - 1)
+        lower = upper - 1
+        h_low, h_high = beam_heights[lower, columns], beam_heights[upper, columns]
+        v_low, v_high = beam_values[lower, columns], beam_values[upper, columns]
+        weight = (heights_km[:, np.newaxis] - h_low) / np.where(h_high > h_low, h_high - h_low, np.inf)
+        bracketed = (weight >= 0.0) & (weight <= 1.0)
+        section = np.where(bracketed, v_low + weight * (v_high - v_low), np.nan)
+
+    # Outside or across gaps in the sweep stack, use the nearest beam within half a beamwidth
+    nearest = np.abs(beam_heights[:, np.newaxis, :] - z).argmin(axis=0)
+    half_beam = point_range * np.deg2rad(NEXRAD_BEAMWIDTH / 2.0)
+    nearest_value = beam_values[nearest, columns]
+    within_beam = np.abs(beam_heights[nearest, columns] - heights_km[:, np.newaxis]) <= half_beam[np.newaxis, :]
+    section = np.where(np.isnan(section) & within_beam, nearest_value, section)
+
+    return distance, heights_km, np.ma.masked_invalid(section)
+
+def create_cross_section_plot(sections, max_height_km=15.0):
+    """Create stacked Plotly heatmaps of vertical cross-sections, one row per product"""
+    fig = make_subplots(
+        rows=len(sections), cols=1, shared_xaxes=True, vertical_spacing=0.08,
+        subplot_titles=[section['title'] for section in sections]
+    )
+    for row, section in enumerate(sections, start=1):
+        colorbar_length = 1.0 / len(sections)
+        fig.add_trace(go.Heatmap(
+            x=section['distance'],
+            y=section['heights'],
+            z=np.ma.filled(section['data'], np.nan),
+            colorscale=section['color_scale'],
+            zmin=section['vmin'],
+            zmax=section['vmax'],
+            colorbar=dict(len=colorbar_length * 0.9, y=1.0 - (row - 0.5) * colorbar_length),
+            hovertemplate='Distance: %{x:.1f} km<br>' +
+                          'Height: %{y:.2f} km<br>' +
+                          'Value: %{z:.1f}<br>' +
+                          '<extra></extra>',
+            name=section['title']
+        ), row=row, col=1)
+        fig.update_yaxes(title_text='Height (km)', range=[0, max_height_km], row=row, col=1)
+    fig.update_xaxes(title_text='Distance Along Section (km)', row=len(sections), col=1)
+    fig.update_layout(
+        height=350 * len(sections) + 100,
+        template='plotly_dark',
+        margin=dict(l=50, r=50, t=60, b=50)
+    )
     return fig
 
+def identify_storm_cells(radar, sweep_idx, threshold_dbz=40.0, min_area_km2=10.0, resolution_km=1.0):
+    """Identify storm cells as connected areas of gridded reflectivity at or above a threshold"""
+    x, y, grid = grid_sweep_to_cartesian(radar, 'reflectivity', sweep_idx, resolution_km)
+    reflectivity = np.ma.filled(grid, -np.inf).astype(np.float64)
+    labels, count = ndimage.label(reflectivity >= threshold_dbz)
+
+    # Per-cell reductions over the label image
+    grid_x, grid_y = np.meshgrid(x, y)
+    flat_labels = labels.ravel()
+    pixels = np.bincount(flat_labels, minlength=count + 1)[1:]
+    sum_x = np.bincount(flat_labels, weights=grid_x.ravel(), minlength=count + 1)[1:]
+    sum_y = np.bincount(flat_labels, weights=grid_y.ravel(), minlength=count + 1)[1:]
+    max_dbz = np.asarray(ndimage.maximum(reflectivity, labels, np.arange(1, count + 1))) if count else np.array([])
+
+    area = pixels * resolution_km ** 2
+    keep = area >= min_area_km2
+    return {
+        'x_km': (sum_x / np.maximum(pixels, 1))[keep],
+        'y_km': (sum_y / np.maximum(pixels, 1))[keep],
+        'area_km2': area[keep],
+        'max_dbz': max_dbz[keep]
+    }
+
+def match_storm_cells(previous, current, dt_seconds, max_speed=40.0):
+    """Match cells between consecutive volumes by mutual nearest centroid and derive motion vectors (m/s)"""
+    n_current = len(current['x_km'])
+    matches = {
+        'previous_index': np.full(n_current, -1),
+        'u': np.full(n_current, np.nan),
+        'v': np.full(n_current, np.nan)
+    }
+    if n_current == 0 or len(previous['x_km']) == 0 or dt_seconds <= 0:
+        return matches
+
+    dx = current['x_km'][:, np.newaxis] - previous['x_km'][np.newaxis, :]
+    dy = current['y_km'][:, np.newaxis] - previous['y_km'][np.newaxis, :]
+    distance = np.hypot(dx, dy)
+
+    # Keep pairs that are each other's nearest neighbour and within reach at max_speed
+    current_idx = np.arange(n_current)
+    nearest_previous = distance.argmin(axis=1)
+    nearest_current = distance.argmin(axis=0)
+    mutual = nearest_current[nearest_previous] == current_idx
+    reachable = distance[current_idx, nearest_previous] <= max_speed * dt_seconds / 1000.0
+    matched = mutual & reachable
+
+    matches['previous_index'][matched] = nearest_previous[matched]
+    matches['u'][matched] = dx[matched, nearest_previous[matched]] * 1000.0 / dt_seconds
+    matches['v'][matched] = dy[matched, nearest_previous[matched]] * 1000.0 / dt_seconds
+    return matches
+
+def get_storm_cell_cache():
+    """Return the per-session cache of storm cell tables and cell matches between volumes"""
+    if 'storm_cell_cache' not in st.session_state:
+        st.session_state['storm_cell_cache'] = {'tables': {}, 'matches': {}}
+    return st.session_state['storm_cell_cache']
+
+def update_storm_tracks(cell_cache, table_key, max_speed=40.0):
+    """Match a volume's cells against the preceding volume from the same radar, reusing cached matches"""
+    current = cell_cache['tables'][table_key]
+    if current['radar_id'] is None or current['time'] is None:
+        return None
+
+    # Preceding volume by filename timestamp, for the same radar and threshold
+    earlier = [
+        (key, table) for key, table in cell_cache['tables'].items()
+        if key[1] == table_key[1] and table['radar_id'] == current['radar_id']
+        and table['time'] is not None and table['time'] < current['time']
+    ]
+    if not earlier:
+        return None
+    previous_key, previous = max(earlier, key=lambda item: item[1]['time'])
+
+    match_key = (previous_key, table_key)
+    if match_key not in cell_cache['matches']:
+        dt_seconds = (current['time'] - previous['time']).total_seconds()
+        cell_cache['matches'][match_key] = match_storm_cells(previous['cells'], current['cells'], dt_seconds, max_speed)
+    return previous, cell_cache['matches'][match_key]
+
+DUAL_POL_PRODUCTS = {
+    'differential_reflectivity': ("Differential Reflectivity (ZDR)", "dB", 'Turbo', -2.0, 6.0),
+    'cross_correlation_ratio': ("Correlation Coefficient (CC)", "", 'Jet', 0.2, 1.05),
+    'differential_phase': ("Differential Phase (ΦDP)", "deg", 'Viridis', 0.0, 360.0),
+    'specific_differential_phase': ("Specific Differential Phase (KDP)", "deg/km", 'Plasma', -1.0, 5.0)
+}
+
+def compute_kdp_for_sweep(radar, sweep_idx, kdp_sweeps):
+    """Retrieve KDP from differential phase for one sweep and store it on the radar (kdp_sweeps records done sweeps)"""
+    if sweep_idx in kdp_sweeps:
+        return False
+
+    # Only the requested sweep and only differential phase are copied for the retrieval
+    phidp_radar = copy.copy(radar)
+    phidp_radar.fields = {'differential_phase': radar.fields['differential_phase']}
+    sweep_radar = phidp_radar.extract_sweeps([sweep_idx])
+    kdp, _ = pyart.retrieve.kdp_vulpiani(
+        sweep_radar,
+        psidp_field='differential_phase',
+        windsize=10,
+        band='S'
+    )
+
+    kdp_field = radar.fields.get('specific_differential_phase')
+    if kdp_field is None:
+        kdp_field = {
+            'data': np.ma.masked_array(np.zeros(radar.fields['differential_phase']['data'].shape, dtype=np.float32), mask=True),
+            'units': 'deg/km',
+            'long_name': 'Specific differential phase (KDP)'
+        }
+        radar.add_field('specific_differential_phase', kdp_field, replace_existing=True)
+
+    kdp_field['data'][radar.get_slice(sweep_idx)] = np.ma.masked_invalid(kdp['data'])
+    kdp_sweeps.add(sweep_idx)
+    return True
+
+MAX_CACHED_VOLUMES = 3
+
+def get_volume_key(uploaded_file):
+    """Build a cache key identifying an uploaded volume by name and content"""
+    # Hash each upload once; file_id changes whenever a new file is uploaded
+    digests = st.session_state.setdefault('volume_digests', {})
+    digest = digests.get(uploaded_file.file_id)
+    if digest is None:
+        digest = hashlib.md5(uploaded_file.getvalue()).hexdigest()
+        # Only the current upload is ever looked up again
+        digests.clear()
+        digests[uploaded_file.file_id] = digest
+    return f"{uploaded_file.name}:{digest}"
+
+def get_volume_cache():
+    """Return the per-session cache of processed radar volumes"""
+    if 'volume_cache' not in st.session_state:
+        st.session_state['volume_cache'] = {}
+    return st.session_state['volume_cache']
+
+def process_radar_volume(uploaded_file, qc_config=None, time_budget=30.0):
+    """Load an uploaded volume, pick the display sweeps and dealias velocity (after QC when configured)"""
+    # Save uploaded file to temporary location
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.gz') as tmp_file:
+        tmp_file.write(uploaded_file.getvalue())
+        tmp_file_path = tmp_file.name
+
+    # Load radar data
+    try:
+        with st.spinner("📡 Loading radar data..."):
+            radar = pyart.io.read_nexrad_archive(tmp_file_path)
+    finally:
+        # Clean up temp file
+        os.unlink(tmp_file_path)
+
+    volume = {
+        'radar': radar,
+        'fields': list(radar.fields.keys()),
+        'refl_sweep': 0,
+        'vel_sweep': 0,
+        'data_age': detect_data_age(radar),
+        'dealiased_available': False,
+        'dealias_success': False,
+        'qc_report': None
+    }
+
+    if 'reflectivity' not in radar.fields:
+        return volume
+
+    # Find best sweeps
+    has_velocity = 'velocity' in radar.fields
+    volume['refl_sweep'] = find_best_sweep(radar, 'reflectivity')
+    volume['vel_sweep'] = find_best_sweep(radar, 'velocity') if has_velocity else 0
+
+    if has_velocity:
+        vel_sweep = volume['vel_sweep']
+        gatefilter = None
+        if qc_config is not None:
+            with st.spinner("🧹 Quality controlling velocity data..."):
+                start_time = time.perf_counter()
+                try:
+                    gatefilter = build_qc_gatefilter(radar, qc_config)
+                    volume['qc_gatefilter'] = gatefilter
+                    volume['qc_report'] = {
+                        'gates_excluded': int(gatefilter.gate_excluded.sum()),
+                        'qc_seconds': time.perf_counter() - start_time
+                    }
+                except Exception as e:
+                    # Dealias without QC rather than failing the whole upload
+                    gatefilter = None
+                    volume['qc_report'] = {
+                        'error': str(e),
+                        'qc_seconds': time.perf_counter() - start_time
+                    }
+
+        with st.spinner("⚡ Processing velocity data..."):
+            # QC time counts against the budget, so QC plus dealiasing stays within it
+            qc_seconds = volume['qc_report']['qc_seconds'] if volume['qc_report'] else 0.0
+            start_time = time.perf_counter()
+            tiers = ['advanced', 'simple'] if volume['data_age'] == "new" else ['simple']
+            tier, corrected_velocity, tier_notes = schedule_dealiasing(
+                radar, vel_sweep, tiers, gatefilter, time_budget - qc_seconds
+            )
+            volume['dealias_seconds'] = time.perf_counter() - start_time
+            volume['dealias_tier'] = tier
+            volume['dealias_notes'] = tier_notes
+            success = tier != 'raw'
+
+            radar.add_field("corrected_velocity", corrected_velocity, replace_existing=True)
+
+            # Convert to MPH
+            velocity_mph = radar.fields["corrected_velocity"].copy()
+            velocity_mph['data'] = velocity_mph['data'] * 2.237
+            velocity_mph['units'] = 'MPH'
+            radar.add_field("corrected_velocity_mph", velocity_mph, replace_existing=True)
+
+            volume['dealias_success'] = success
+            volume['dealiased_available'] = True
+
+    return volume
+
+def report_qc_regions(volume):
+    """Count velocity regions with and without the QC filter, on demand and outside the dealiasing budget"""
+    qc_report = volume['qc_report']
+    if 'regions_before' not in qc_report:
+        radar = volume['radar']
+        nyq = get_nyquist_velocity(radar, volume['vel_sweep'])
+        start_time = time.perf_counter()
+        qc_report['regions_before'] = count_velocity_regions(radar, nyq)
+        qc_report['regions_after'] = count_velocity_regions(radar, nyq, volume['qc_gatefilter'])
+        qc_report['count_seconds'] = time.perf_counter() - start_time
+    return qc_report
+
 # Streamlit App
 def main():
     st.title("NEXRAD Radar Data Viewer")
@@ -610,6 +1359,76 @@ def main():
             st.markdown("### ⚙️ Advanced Options")
             max_range = st.slider("Maximum Range (km)", 50, 300, 250, 25)
             show_range_rings = st.checkbox("Show Range Rings", True)
+            render_mode = st.radio(
+                "Render Mode",
+                RENDER_MODES,
+                index=0,
+                help="Native Gates plots the sweep as recorded; Cartesian Grid resamples it to a 1 km grid"
+            )
+            
+            # Rotation product
+            show_shear = st.checkbox(
+                "Show Azimuthal Shear", False,
+                help="Rotation product derived from the dealiased velocity sweep"
+            )
+            show_couplets = False
+            couplet_threshold = 10.0
+            if show_shear:
+                show_couplets = st.checkbox("Highlight Rotation Couplets", True)
+                couplet_threshold = st.slider("Couplet Threshold (10⁻³ s⁻¹)", 5.0, 30.0, 10.0, 0.5)
+            
+            # Storm cell identification and tracking
+            show_cells = st.checkbox(
+                "Identify Storm Cells", False,
+                help="Cells are tracked across uploaded volumes from the same radar, ordered by filename time"
+            )
+            cell_threshold = 40.0
+            if show_cells:
+                cell_threshold = st.slider("Cell Threshold (dBZ)", 30.0, 60.0, 40.0, 5.0)
+            
+            dealias_budget = st.slider(
+                "Dealiasing Time Budget (s)", 5, 120, 30, 5,
+                help="Covers velocity QC plus dealiasing; slower tiers are abandoned when it runs out and the best finished tier is shown"
+            )
+            
+            # Velocity quality control applied before dealiasing
+            with st.expander("🧹 Velocity Quality Control"):
+                qc_enabled = st.checkbox(
+                    "Filter gates before dealiasing", True,
+                    help="Removes speckle, weak echo, noisy texture and out-of-range gates so region-based dealiasing has fewer regions to unfold"
+                )
+                qc_config = None
+                qc_count_regions = False
+                if qc_enabled:
+                    qc_config = {
+                        'min_reflectivity': st.slider("Reflectivity Floor (dBZ)", -32.0, 20.0, QC_DEFAULTS['min_reflectivity'], 1.0),
+                        'max_texture': st.slider("Velocity Texture Ceiling (m/s)", 5.0, 40.0, QC_DEFAULTS['max_texture'], 1.0),
+                        'min_range_km': st.slider("Minimum Range (km)", 0.0, 20.0, QC_DEFAULTS['min_range_km'], 1.0),
+                        'max_range_km': st.slider("Maximum Velocity Range (km)", 100.0, 460.0, QC_DEFAULTS['max_range_km'], 10.0),
+                        'min_region_gates': st.slider("Minimum Region Size (gates)", 1, 100, QC_DEFAULTS['min_region_gates'], 1)
+                    }
+                    qc_count_regions = st.checkbox(
+                        "Report region counts", False,
+                        help="Counts connected velocity regions before and after QC; runs after dealiasing, outside the time budget"
+                    )
+            
+            # Vertical cross-section endpoints (km from the radar)
+            with st.expander("✂️ Vertical Cross-Section"):
+                show_cross_section = st.checkbox(
+                    "Show Cross-Section", False,
+                    help="Reflectivity and velocity along a line, interpolated across every sweep"
+                )
+                section_start = (-50, 0)
+                section_end = (50, 0)
+                if show_cross_section:
+                    section_start = (
+                        st.slider("Start East (km)", -300, 300, section_start[0], 1),
+                        st.slider("Start North (km)", -300, 300, section_start[1], 1)
+                    )
+                    section_end = (
+                        st.slider("End East (km)", -300, 300, section_end[0], 1),
+                        st.slider("End North (km)", -300, 300, section_end[1], 1)
+                    )
             
             # File info section
             st.markdown("---")
@@ -635,21 +1454,27 @@ def main():
             # Show available fields in sidebar
             st.sidebar.markdown("### 🔍 Processing Status")
             
-            # Save uploaded file to temporary location
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.gz') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
+            # Load and dealias the volume once; reruns reuse the cached result
+            volume_key = get_volume_key(uploaded_file)
+            cache_key = (volume_key, tuple(sorted(qc_config.items())) if qc_config else None, dealias_budget)
+            volume_cache = get_volume_cache()
+            volume = volume_cache.get(cache_key)
+            if volume is None:
+                volume = process_radar_volume(uploaded_file, qc_config, dealias_budget)
+                volume_cache[cache_key] = volume
+                while len(volume_cache) > MAX_CACHED_VOLUMES:
+                    volume_cache.pop(next(iter(volume_cache)))
             
-            # Load radar data
-            with st.spinner("📡 Loading radar data..."):
-                radar = pyart.io.read_nexrad_archive(tmp_file_path)
+            # Only the volume on screen keeps its memoized figures
+            for other_key, other_volume in volume_cache.items():
+                if other_key != cache_key:
+                    other_volume.pop('figures', None)
             
-            # Clean up temp file
-            os.unlink(tmp_file_path)
+            radar = volume['radar']
             
             # Display available fields in sidebar
             st.sidebar.write("**Available Fields:**")
-            for field in radar.fields.keys():
+            for field in volume['fields']:
                 st.sidebar.write(f"✓ {field}")
             
             # Check for required fields
@@ -660,41 +1485,33 @@ def main():
                 st.error("❌ Reflectivity field not found in radar data.")
                 return
             
-            # Find best sweeps
-            refl_sweep = find_best_sweep(radar, 'reflectivity')
-            vel_sweep = find_best_sweep(radar, 'velocity') if has_velocity else 0
-            
-            # Detect data age and process velocity
-            data_age = detect_data_age(radar)
+            refl_sweep = volume['refl_sweep']
+            vel_sweep = volume['vel_sweep']
+            data_age = volume['data_age']
+            dealiased_available = volume['dealiased_available']
             st.sidebar.write(f"**Data Type:** {data_age.upper()}")
             
-            dealiased_available = False
-            
             if has_velocity:
-                with st.spinner("⚡ Processing velocity data..."):
-                    if data_age == "new":
-                        success = advanced_velocity_dealiasing_new_data(radar, vel_sweep)
-                        if not success:
-                            success = simple_velocity_dealiasing_old_data(radar, vel_sweep)
-                    else:
-                        success = simple_velocity_dealiasing_old_data(radar, vel_sweep)
-                    
-                    if success:
-                        dealiased_available = True
-                        # Convert to MPH
-                        velocity_mph = radar.fields["corrected_velocity"].copy()
-                        velocity_mph['data'] = velocity_mph['data'] * 2.237
-                        velocity_mph['units'] = 'MPH'
-                        radar.add_field("corrected_velocity_mph", velocity_mph, replace_existing=True)
-                        st.sidebar.success("✅ Velocity dealiasing completed")
-                    else:
-                        st.sidebar.warning("⚠️ Using original velocity data")
-                        radar.add_field("corrected_velocity", radar.fields["velocity"], replace_existing=True)
-                        velocity_mph = radar.fields["corrected_velocity"].copy()
-                        velocity_mph['data'] = velocity_mph['data'] * 2.237
-                        velocity_mph['units'] = 'MPH'
-                        radar.add_field("corrected_velocity_mph", velocity_mph, replace_existing=True)
-                        dealiased_available = True
+                if volume['dealias_success']:
+                    st.sidebar.success("✅ Velocity dealiasing completed")
+                else:
+                    st.sidebar.warning("⚠️ Using original velocity data")
+                
+                qc_report = volume['qc_report']
+                if qc_report and 'error' in qc_report:
+                    st.sidebar.warning(f"⚠️ Velocity QC failed, dealiased without it: {qc_report['error']}")
+                elif qc_report:
+                    st.sidebar.write(f"**QC Gates Removed:** {qc_report['gates_excluded']:,}")
+                    if qc_count_regions:
+                        with st.spinner("Counting velocity regions..."):
+                            report_qc_regions(volume)
+                        st.sidebar.write(f"**QC Regions:** {qc_report['regions_before']:,} → {qc_report['regions_after']:,}")
+                        st.sidebar.write(f"**Region Count Time:** {qc_report['count_seconds']:.2f} s (not part of QC)")
+                    st.sidebar.write(f"**QC Time:** {qc_report['qc_seconds']:.2f} s")
+                st.sidebar.write(f"**Dealiasing Tier:** {DEALIAS_TIERS[volume['dealias_tier']][0]}")
+                for tier, note in volume['dealias_notes'].items():
+                    st.sidebar.caption(f"{DEALIAS_TIERS[tier][0]}: {note}")
+                st.sidebar.write(f"**Dealiasing Time:** {volume['dealias_seconds']:.2f} s")
             
             # Create colormaps
             dbz_values, refl_colors = create_custom_reflectivity_colormap()
@@ -704,16 +1521,71 @@ def main():
             refl_colorscale = [[i/(len(refl_colors)-1), f'rgb({r},{g},{b})'] for i, (r, g, b) in enumerate(refl_colors)]
             vel_colorscale = [[i/(len(vel_colors)-1), f'rgb({r},{g},{b})'] for i, (r, g, b) in enumerate(vel_colors)]
             
+            # Section line drawn on the PPIs as a layout shape
+            section_shapes = []
+            if show_cross_section:
+                section_shapes.append(dict(
+                    type='line', xref='x', yref='y',
+                    x0=section_start[0], y0=section_start[1],
+                    x1=section_end[0], y1=section_end[1],
+                    line=dict(color='white', width=2),
+                    layer='above'
+                ))
+            
+            # Storm cells on the best reflectivity sweep; tables are cached per volume
+            storm_cells = None
+            storm_track = None
+            refl_shapes = list(section_shapes)
+            if show_cells:
+                cell_cache = get_storm_cell_cache()
+                table_key = (volume_key, cell_threshold)
+                if table_key not in cell_cache['tables']:
+                    cell_cache['tables'][table_key] = {
+                        'radar_id': file_info['radar_id'] if file_info else None,
+                        'time': file_info['datetime'] if file_info else None,
+                        'cells': identify_storm_cells(radar, refl_sweep, cell_threshold)
+                    }
+                storm_cells = cell_cache['tables'][table_key]['cells']
+                storm_track = update_storm_tracks(cell_cache, table_key)
+                
+                # Track segments from the previous centroid to the current one
+                if storm_track is not None:
+                    previous_cells, matches = storm_track
+                    for i in np.flatnonzero(matches['previous_index'] >= 0):
+                        j = matches['previous_index'][i]
+                        refl_shapes.append(dict(
+                            type='line', xref='x', yref='y',
+                            x0=previous_cells['x_km'][j], y0=previous_cells['y_km'][j],
+                            x1=storm_cells['x_km'][i], y1=storm_cells['y_km'][i],
+                            line=dict(color='cyan', width=2),
+                            layer='above'
+                        ))
+            
             # Display plots based on mode
             if display_mode == "Reflectivity" or display_mode == "Both":
                 st.subheader(f"Reflectivity (Sweep {refl_sweep}) - {data_age.upper()} Data")
                 
                 with st.spinner("Generating reflectivity plot..."):
-                    refl_fig = create_plotly_radar_plot(
-                        radar, 'reflectivity', refl_sweep,
+                    refl_fig = get_radar_figure(
+                        volume, 'reflectivity', refl_sweep,
                         f"NEXRAD Reflectivity (Sweep {refl_sweep}) - dBZ",
-                        refl_colorscale, -32, 94.5, max_range, show_range_rings
+                        refl_colorscale, -32, 94.5, max_range, show_range_rings, render_mode, refl_shapes
                     )
+                    if storm_cells is not None:
+                        refl_fig.add_trace(go.Scatter(
+                            x=storm_cells['x_km'], y=storm_cells['y_km'],
+                            mode='markers+text',
+                            text=[str(i + 1) for i in range(len(storm_cells['x_km']))],
+                            textposition='top center',
+                            marker=dict(symbol='x', size=10, color='white'),
+                            customdata=np.column_stack([storm_cells['area_km2'], storm_cells['max_dbz']]),
+                            hovertemplate='<b>Cell %{text}</b><br>' +
+                                          'Area: %{customdata[0]:.0f} km²<br>' +
+                                          'Max: %{customdata[1]:.1f} dBZ<br>' +
+                                          '<extra></extra>',
+                            showlegend=False,
+                            name='Storm cells'
+                        ))
                     st.plotly_chart(refl_fig, use_container_width=True)
                 
                 # Show statistics
@@ -730,15 +1602,36 @@ def main():
                     st.metric("Min dBZ", f"{valid_data.min():.1f}")
                 with col4:
                     st.metric("Valid Gates", f"{len(valid_data):,}")
+                
+                if storm_cells is not None:
+                    st.markdown(f"**Storm Cells (≥ {cell_threshold:.0f} dBZ):** {len(storm_cells['x_km'])}")
+                    if storm_track is None:
+                        st.caption("Upload an earlier volume from the same radar to track cell motion.")
+                    cell_rows = []
+                    for i in range(len(storm_cells['x_km'])):
+                        row = {
+                            'Cell': i + 1,
+                            'East (km)': round(float(storm_cells['x_km'][i]), 1),
+                            'North (km)': round(float(storm_cells['y_km'][i]), 1),
+                            'Area (km²)': round(float(storm_cells['area_km2'][i]), 0),
+                            'Max dBZ': round(float(storm_cells['max_dbz'][i]), 1)
+                        }
+                        if storm_track is not None and storm_track[1]['previous_index'][i] >= 0:
+                            u, v = storm_track[1]['u'][i], storm_track[1]['v'][i]
+                            row['Speed (MPH)'] = round(float(np.hypot(u, v)) * 2.237, 1)
+                            row['Heading (°)'] = round(float(np.rad2deg(np.arctan2(u, v))) % 360, 0)
+                        cell_rows.append(row)
+                    if cell_rows:
+                        st.dataframe(cell_rows, use_container_width=True)
             
             if (display_mode == "Velocity" or display_mode == "Both") and has_velocity and dealiased_available:
                 st.subheader(f"Dealiased Velocity (Sweep {vel_sweep}) - {data_age.upper()} Data")
                 
                 with st.spinner("Generating velocity plot..."):
-                    vel_fig = create_plotly_radar_plot(
-                        radar, 'corrected_velocity_mph', vel_sweep,
+                    vel_fig = get_radar_figure(
+                        volume, 'corrected_velocity_mph', vel_sweep,
                         f"Dealiased Velocity (Sweep {vel_sweep}) - MPH",
-                        vel_colorscale, -127, 127, max_range, show_range_rings
+                        vel_colorscale, -127, 127, max_range, show_range_rings, render_mode, section_shapes
                     )
                     st.plotly_chart(vel_fig, use_container_width=True)
                 
@@ -759,6 +1652,153 @@ def main():
                     
             elif display_mode == "Velocity" or display_mode == "Both":
                 st.warning("Velocity data not available or processing failed.")
+            
+            if show_cross_section:
+                st.subheader("Vertical Cross-Section")
+                
+                # Geometry and sweep ordering are built once per volume
+                if 'geometry' not in volume:
+                    volume['geometry'] = build_volume_geometry(radar)
+                section_sweeps = volume.setdefault('section_sweeps', {})
+                
+                section_products = [('reflectivity', "Reflectivity (dBZ)", refl_colorscale, -32, 94.5)]
+                if has_velocity and dealiased_available:
+                    section_products.append(('corrected_velocity_mph', "Dealiased Velocity (MPH)", vel_colorscale, -127, 127))
+                
+                start_time = time.perf_counter()
+                sections = []
+                for field_name, section_title, color_scale, vmin, vmax in section_products:
+                    if field_name not in section_sweeps:
+                        section_sweeps[field_name] = select_cross_section_sweeps(radar, volume['geometry'], field_name)
+                    distance, heights, section_data = compute_cross_section(
+                        radar, section_sweeps[field_name], field_name, section_start, section_end
+                    )
+                    sections.append({
+                        'title': section_title,
+                        'distance': distance,
+                        'heights': heights,
+                        'data': section_data,
+                        'color_scale': color_scale,
+                        'vmin': vmin,
+                        'vmax': vmax
+                    })
+                section_seconds = time.perf_counter() - start_time
+                
+                st.plotly_chart(create_cross_section_plot(sections), use_container_width=True)
+                st.caption(
+                    f"From ({section_start[0]}, {section_start[1]}) km to ({section_end[0]}, {section_end[1]}) km, "
+                    f"{len(section_sweeps['reflectivity'])} reflectivity sweeps, computed in {section_seconds * 1000:.0f} ms"
+                )
+            
+            if show_shear and has_velocity and dealiased_available:
+                st.subheader(f"Azimuthal Shear (Sweep {vel_sweep}) - {data_age.upper()} Data")
+                
+                # Computed once per volume from the dealiased sweep and kept on the radar
+                shear_field = radar.fields.get('azimuthal_shear')
+                if shear_field is None or shear_field['sweep'] != vel_sweep:
+                    start_time = time.perf_counter()
+                    add_azimuthal_shear_field(radar, vel_sweep)
+                    volume['shear_seconds'] = time.perf_counter() - start_time
+                
+                shear_fig = get_radar_figure(
+                    volume, 'azimuthal_shear', vel_sweep,
+                    f"Azimuthal Shear (Sweep {vel_sweep}) - 10⁻³ s⁻¹",
+                    'RdBu_r', -20, 20, max_range, show_range_rings, render_mode
+                )
+                
+                # Folds in raw velocity read as false shear, so couplets need a dealiased sweep
+                velocity_is_raw = volume.get('dealias_tier') == 'raw'
+                if velocity_is_raw:
+                    st.warning("⚠️ Dealiasing did not finish, so shear is computed on raw (aliased) velocity. "
+                               "Velocity folds appear as false shear and couplets are not shown.")
+                
+                couplets = None
+                if show_couplets and not velocity_is_raw:
+                    couplets = find_rotation_couplets(radar, vel_sweep, couplet_threshold)
+                    shear_fig.add_trace(go.Scatter(
+                        x=couplets['x'], y=couplets['y'],
+                        mode='markers',
+                        marker=dict(symbol='circle-open', size=14, color='yellow', line=dict(width=2)),
+                        customdata=couplets['shear'],
+                        hovertemplate='<b>Couplet</b><br>' +
+                                      'X: %{x:.1f} km<br>' +
+                                      'Y: %{y:.1f} km<br>' +
+                                      'Shear: %{customdata:.1f} × 10⁻³ s⁻¹<br>' +
+                                      '<extra></extra>',
+                        showlegend=False,
+                        name='Rotation couplets'
+                    ))
+                st.plotly_chart(shear_fig, use_container_width=True)
+                
+                # Show shear statistics
+                sweep_slice = radar.get_slice(vel_sweep)
+                shear_data = radar.fields['azimuthal_shear']['data'][sweep_slice]
+                valid_data = shear_data.compressed()
+                
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Max Shear", f"{valid_data.max():.1f} × 10⁻³ s⁻¹" if len(valid_data) else "N/A")
+                with col2:
+                    st.metric("Couplets", f"{len(couplets['shear'])}" if couplets is not None else "Off")
+                with col3:
+                    st.metric("Compute Time", f"{volume.get('shear_seconds', 0.0) * 1000:.0f} ms")
+                with col4:
+                    st.metric("Valid Gates", f"{len(valid_data):,}")
+            
+            # Dual-polarization panel; each product is only sliced and rendered when selected
+            # Options must not change once KDP has been added to the radar, or Streamlit resets the selection
+            dual_pol_available = [
+                field for field in DUAL_POL_PRODUCTS
+                if field != 'specific_differential_phase' and field in radar.fields
+            ]
+            if 'differential_phase' in radar.fields:
+                dual_pol_available.append('specific_differential_phase')
+            
+            if dual_pol_available:
+                st.markdown("---")
+                st.subheader("Dual-Polarization Products")
+                
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    dual_pol_selected = st.multiselect(
+                        "Products",
+                        dual_pol_available,
+                        format_func=lambda field: DUAL_POL_PRODUCTS[field][0],
+                        help="KDP is retrieved from differential phase for the displayed sweep only"
+                    )
+                with col2:
+                    dual_pol_sweep = st.selectbox(
+                        "Sweep",
+                        list(range(radar.nsweeps)),
+                        index=refl_sweep,
+                        format_func=lambda sweep: f"Sweep {sweep} ({radar.fixed_angle['data'][sweep]:.1f}°)"
+                    )
+                
+                for field_name in dual_pol_selected:
+                    product_title, units, color_scale, vmin, vmax = DUAL_POL_PRODUCTS[field_name]
+                    
+                    if field_name == 'specific_differential_phase':
+                        try:
+                            with st.spinner("Retrieving KDP..."):
+                                start_time = time.perf_counter()
+                                if compute_kdp_for_sweep(radar, dual_pol_sweep, volume.setdefault('kdp_sweeps', set())):
+                                    volume.setdefault('kdp_seconds', {})[dual_pol_sweep] = time.perf_counter() - start_time
+                        except Exception as e:
+                            st.warning(f"KDP retrieval failed: {e}")
+                            continue
+                    
+                    st.markdown(f"**{product_title} (Sweep {dual_pol_sweep})**")
+                    product_fig = get_radar_figure(
+                        volume, field_name, dual_pol_sweep,
+                        f"{product_title} (Sweep {dual_pol_sweep})" + (f" - {units}" if units else ""),
+                        color_scale, vmin, vmax, max_range, show_range_rings, render_mode
+                    )
+                    st.plotly_chart(product_fig, use_container_width=True)
+                    
+                    if field_name == 'specific_differential_phase':
+                        kdp_seconds = volume.get('kdp_seconds', {}).get(dual_pol_sweep)
+                        if kdp_seconds is not None:
+                            st.caption(f"KDP retrieved for this sweep in {kdp_seconds:.2f} s and cached for the volume")
                 
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")